@@ -1,39 +1,110 @@
 # -*- coding: utf-8 -*-
 import sys
+import atexit
 import os
-import time
-import codecs
+import io
+import json
 import logging
 import subprocess
 import tempfile
 from functools import wraps
-PYSIDE = False
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 try:
+    # Doesn't load Qt, but has to run before any PyQt4 module is imported.
     import sip
     sip.setapi('QVariant', 2)
-    from PyQt4 import QtWebKit
-    from PyQt4.QtNetwork import QNetworkRequest, QNetworkAccessManager,\
-                                QNetworkCookieJar, QNetworkDiskCache
-    from PyQt4 import QtCore
-    from PyQt4.QtCore import QSize, QByteArray, QUrl
-    from PyQt4.QtGui import QApplication, QImage, QPainter, QPrinter
 except ImportError:
-    try:
-        from PySide import QtWebKit
-        from PySide.QtNetwork import QNetworkRequest, QNetworkAccessManager,\
-                                    QNetworkCookieJar, QNetworkDiskCache
-        from PySide import QtCore
-        from PySide.QtCore import QSize, QByteArray, QUrl
-        from PySide.QtGui import QApplication, QImage, QPainter, QPrinter
-        PYSIDE = True
-    except ImportError:
-        raise Exception("Ghost.py requires PySide or PyQt")
+    pass
+PYSIDE = False
+# Qt bindings, imported by _lazy_qt() the first time they are needed so
+# that importing ghost doesn't load them. GhostWebPage and MemCache are
+# also None until then.
+QtWebKit = QtCore = None
+QNetworkRequest = QNetworkAccessManager = QNetworkCookieJar = None
+QNetworkDiskCache = QAbstractNetworkCache = QNetworkCacheMetaData = None
+QSize = QByteArray = QUrl = QEventLoop = QTimer = QBuffer = QIODevice = None
+Signal = QApplication = QImage = QPainter = QPrinter = QRegion = None
+GhostWebPage = MemCache = None
 
 
 default_user_agent = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/535.2 " +\
     "(KHTML, like Gecko) Chrome/15.0.874.121 Safari/535.2"
 
 
+_text = str if sys.version_info[0] >= 3 else unicode
+
+if sys.version_info[0] >= 3:
+    def _reraise(exc_type, exc_value, exc_tb):
+        raise exc_value.with_traceback(exc_tb)
+else:
+    exec('def _reraise(exc_type, exc_value, exc_tb):\n'
+        '    raise exc_type, exc_value, exc_tb\n')
+
+
+# Input types whose value is set as plain text.
+_TEXT_INPUT_TYPES = frozenset(["color", "date", "datetime", "datetime-local",
+    "email", "hidden", "month", "number", "password", "range", "search",
+    "tel", "text", "time", "url", "week"])
+
+
+# Helpers bound to each page window, so that Ghost evaluates constant
+# scripts that only differ by their JSON encoded arguments.
+_HELPERS_JS = """
+    window.__ghost = {
+        click: function(selector) {
+            var element = document.querySelector(selector);
+            var evt = document.createEvent("MouseEvents");
+            evt.initMouseEvent("click", true, true, window, 1, 1, 1, 1, 1,
+                false, false, false, false, 0, element);
+            return element.dispatchEvent(evt);
+        },
+        fire: function(selector, method) {
+            return document.querySelector(selector)[method]();
+        },
+        hasGlobal: function(name) {
+            var value = window, parts = name.split('.');
+            for (var i = 0; i < parts.length; i++) {
+                if (value === undefined || value === null) {
+                    return false;
+                }
+                value = value[parts[i]];
+            }
+            return typeof value !== "undefined";
+        }
+    };
+    (function() {
+        // Counts DOM mutations, letting Ghost know when a cached
+        // selector lookup has gone stale.
+        var generation = 0, observer = null;
+        var Observer = window.MutationObserver ||
+            window.WebKitMutationObserver;
+        if (Observer) {
+            observer = new Observer(function() {
+                generation++;
+            });
+            observer.observe(document, {childList: true, attributes: true,
+                characterData: true, subtree: true});
+        }
+        window.__ghost.domGeneration = function() {
+            if (observer === null) {
+                return null;
+            }
+            // Records are only delivered once the current script is
+            // done, takes the pending ones into account right away.
+            if (observer.takeRecords().length) {
+                generation++;
+            }
+            return generation;
+        };
+    })();
+"""
+
+
 logging.basicConfig()
 logger = logging.getLogger('ghost')
 
@@ -46,67 +117,209 @@ class Logger(logging.Logger):
         getattr(logger, level)("%s: %s", sender, message)
 
 
-class GhostWebPage(QtWebKit.QWebPage):
-    """Overrides QtWebKit.QWebPage in order to intercept some graphical
-    behaviours like alert(), confirm().
-    Also intercepts client side console.log().
+def _lazy_qt():
+    """Imports PyQt4, or PySide as a fallback, and defines the classes
+    built on top of Qt. Only runs once, on first use.
     """
-    def chooseFile(self, frame, suggested_file=None):
-        return Ghost._upload_file
-
-    def javaScriptConsoleMessage(self, message, line, source):
-        """Prints client console message in current output stream."""
-        super(GhostWebPage, self).javaScriptConsoleMessage(message, line,
-            source)
-        log_type = "error" if "Error" in message else "info"
-        Logger.log("%s(%d): %s" % (source or '<unknown>', line, message),
-        sender="Frame", level=log_type)
-
-    def javaScriptAlert(self, frame, message):
-        """Notifies ghost for alert, then pass."""
-        Ghost._alert = message
-        Logger.log("alert('%s')" % message, sender="Frame")
-
-    def javaScriptConfirm(self, frame, message):
-        """Checks if ghost is waiting for confirm, then returns the right
-        value.
-        """
-        if Ghost._confirm_expected is None:
-            raise Exception('You must specified a value to confirm "%s"' %
-                message)
-        confirmation, callback = Ghost._confirm_expected
-        Ghost._confirm_expected = None
-        Logger.log("confirm('%s')" % message, sender="Frame")
-        if callback is not None:
-            return callback()
-        return confirmation
-
-    def javaScriptPrompt(self, frame, message, defaultValue, result=None):
-        """Checks if ghost is waiting for prompt, then enters the right
-        value.
-        """
-        if Ghost._prompt_expected is None:
-            raise Exception('You must specified a value for prompt "%s"' %
-                message)
-        result_value, callback = Ghost._prompt_expected
-        Logger.log("prompt('%s')" % message, sender="Frame")
-        if callback is not None:
-            result_value = callback()
-        if result_value == '':
-            Logger.log("'%s' prompt filled with empty string" % message,
-                level='warning')
-        Ghost._prompt_expected = None
-        if result is None:
-            # PySide
-            return True, result_value
-        result.append(result_value)
-        return True
+    global PYSIDE, QtWebKit, QtCore, QNetworkRequest, QNetworkAccessManager,\
+        QNetworkCookieJar, QNetworkDiskCache, QAbstractNetworkCache,\
+        QNetworkCacheMetaData, QSize, QByteArray, QUrl, QEventLoop, QTimer,\
+        QBuffer, QIODevice, Signal, QApplication, QImage, QPainter, QPrinter,\
+        QRegion, GhostWebPage, MemCache
+    if GhostWebPage is not None:
+        return
+    try:
+        from PyQt4 import QtWebKit
+        from PyQt4.QtNetwork import QNetworkRequest, QNetworkAccessManager,\
+                                    QNetworkCookieJar, QNetworkDiskCache,\
+                                    QAbstractNetworkCache,\
+                                    QNetworkCacheMetaData
+        from PyQt4 import QtCore
+        from PyQt4.QtCore import QSize, QByteArray, QUrl, QEventLoop, QTimer,\
+                                 QBuffer, QIODevice
+        from PyQt4.QtCore import pyqtSignal as Signal
+        from PyQt4.QtGui import QApplication, QImage, QPainter, QPrinter,\
+                                QRegion
+    except ImportError:
+        try:
+            from PySide import QtWebKit
+            from PySide.QtNetwork import QNetworkRequest,\
+                                        QNetworkAccessManager,\
+                                        QNetworkCookieJar, QNetworkDiskCache,\
+                                        QAbstractNetworkCache,\
+                                        QNetworkCacheMetaData
+            from PySide import QtCore
+            from PySide.QtCore import QSize, QByteArray, QUrl, QEventLoop,\
+                                       QTimer, QBuffer, QIODevice, Signal
+            from PySide.QtGui import QApplication, QImage, QPainter,\
+                                      QPrinter, QRegion
+            PYSIDE = True
+        except ImportError:
+            raise Exception("Ghost.py requires PySide or PyQt")
+
+    class GhostWebPage(QtWebKit.QWebPage):
+        """Overrides QtWebKit.QWebPage in order to intercept some graphical
+        behaviours like alert(), confirm().
+        Also intercepts client side console.log().
+        """
+        alerted = Signal()
+
+        def chooseFile(self, frame, suggested_file=None):
+            return Ghost._upload_file
+
+        def javaScriptConsoleMessage(self, message, line, source):
+            """Prints client console message in current output stream."""
+            super(GhostWebPage, self).javaScriptConsoleMessage(message, line,
+                source)
+            log_type = "error" if "Error" in message else "info"
+            Logger.log("%s(%d): %s" % (source or '<unknown>', line, message),
+            sender="Frame", level=log_type)
+
+        def javaScriptAlert(self, frame, message):
+            """Notifies ghost for alert, then pass."""
+            Ghost._alert = message
+            Logger.log("alert('%s')" % message, sender="Frame")
+            self.alerted.emit()
+
+        def javaScriptConfirm(self, frame, message):
+            """Checks if ghost is waiting for confirm, then returns the right
+            value.
+            """
+            if Ghost._confirm_expected is None:
+                raise Exception('You must specified a value to confirm "%s"' %
+                    message)
+            confirmation, callback = Ghost._confirm_expected
+            Ghost._confirm_expected = None
+            Logger.log("confirm('%s')" % message, sender="Frame")
+            if callback is not None:
+                return callback()
+            return confirmation
+
+        def javaScriptPrompt(self, frame, message, defaultValue, result=None):
+            """Checks if ghost is waiting for prompt, then enters the right
+            value.
+            """
+            if Ghost._prompt_expected is None:
+                raise Exception('You must specified a value for prompt "%s"' %
+                    message)
+            result_value, callback = Ghost._prompt_expected
+            Logger.log("prompt('%s')" % message, sender="Frame")
+            if callback is not None:
+                result_value = callback()
+            if result_value == '':
+                Logger.log("'%s' prompt filled with empty string" % message,
+                    level='warning')
+            Ghost._prompt_expected = None
+            if result is None:
+                # PySide
+                return True, result_value
+            result.append(result_value)
+            return True
 
-    def setUserAgent(self, user_agent):
-        self.user_agent = user_agent
+        def setUserAgent(self, user_agent):
+            self.user_agent = user_agent
 
-    def userAgentForUrl(self, url):
-        return self.user_agent
+        def userAgentForUrl(self, url):
+            return self.user_agent
+
+    class MemCache(QAbstractNetworkCache):
+        """Network cache that keeps responses in memory, evicting the least
+        recently used ones once over its maximum size.
+
+        :param max_size: The maximum cache size in bytes.
+        """
+        def __init__(self, max_size, parent=None):
+            super(MemCache, self).__init__(parent)
+            self.max_size = max_size
+            self._entries = OrderedDict()
+            self._pending = {}
+            self._size = 0
+
+        def cacheSize(self):
+            return self._size
+
+        def clear(self):
+            # Pending devices are still being written by Qt, they are left
+            # for insert() or remove() to release.
+            self._entries.clear()
+            self._size = 0
+
+        def data(self, url):
+            key = self._key(url)
+            if key not in self._entries:
+                return None
+            # Marks the entry as the most recently used one.
+            entry = self._entries[key] = self._entries.pop(key)
+            buffer = QBuffer()
+            buffer.setData(entry[1])
+            buffer.open(QIODevice.ReadOnly)
+            return buffer
+
+        def insert(self, device):
+            if device not in self._pending:
+                return
+            key, meta_data = self._pending.pop(device)
+            data = device.data()
+            self._release(device)
+            self._pop(key)
+            if data.size() > self.max_size:
+                return
+            self._entries[key] = (meta_data, data)
+            self._size += data.size()
+            while self._size > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+        def metaData(self, url):
+            entry = self._entries.get(self._key(url))
+            if entry is None:
+                return QNetworkCacheMetaData()
+            return entry[0]
+
+        def prepare(self, meta_data):
+            if not meta_data.isValid() or not meta_data.saveToDisk():
+                return None
+            buffer = QBuffer()
+            buffer.open(QIODevice.ReadWrite)
+            self._pending[buffer] = (self._key(meta_data.url()), meta_data)
+            return buffer
+
+        def remove(self, url):
+            key = self._key(url)
+            for device, pending in list(self._pending.items()):
+                if pending[0] == key:
+                    del self._pending[device]
+                    self._release(device)
+            return self._pop(key)
+
+        def updateMetaData(self, meta_data):
+            key = self._key(meta_data.url())
+            if key in self._entries:
+                self._entries[key] = (meta_data, self._entries[key][1])
+
+        def _key(self, url):
+            return _text(QUrl(url).toString())
+
+        def _release(self, device):
+            """Schedules the deletion of a device returned by prepare(),
+            parenting it first so that dropping the Python reference
+            doesn't destroy it right away.
+
+            :param device: The QBuffer.
+            """
+            device.setParent(self)
+            device.deleteLater()
+
+        def _pop(self, key):
+            """Removes an entry from the cache.
+
+            :param key: The entry url as a string.
+            :return: True if an entry was removed.
+            """
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._size -= entry[1].size()
+            return True
 
 
 def can_load_page(func):
@@ -128,32 +341,142 @@ def can_load_page(func):
     return wrapper
 
 
+class _LazyHeaders(Mapping):
+    """Read-only mapping of reply raw headers, decoded on access.
+
+    :param reply: The QNetworkReply object.
+    """
+    def __init__(self, reply):
+        self._raw_headers = reply.rawHeaderPairs()
+        self._by_name = None
+        self._values = {}
+
+    def _index(self):
+        if self._by_name is None:
+            self._by_name = dict((bytes(name).decode('latin-1'), value)
+                for name, value in self._raw_headers)
+        return self._by_name
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            self._values[name] = bytes(self._index()[name])\
+                .decode('latin-1')
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+
 class HttpResource(object):
     """Represents an HTTP resource.
     """
     def __init__(self, reply, cache, content=None):
+        _lazy_qt()
         if PYSIDE:
             self.url = reply.url().toString()
         else:
             self.url = reply.url()
-        self.content = content
-        if self.content is None:
-            # Tries to get back content from cache
+        self._content = content
+        self._content_decoded = content is not None
+        if content is None:
+            # Tries to get back content from cache, decoding is deferred
+            # until the content is actually read.
             buffer = cache.data(self.url)
             if buffer is not None:
-                content = buffer.readAll()
-                try:
-                    self.content = unicode(content)
-                except UnicodeDecodeError:
-                    self.content = content
+                self._content = buffer.readAll()
+            else:
+                self._content_decoded = True
         self.http_status = reply.attribute(
             QNetworkRequest.HttpStatusCodeAttribute)
         Logger.log("Resource loaded: %s %s" % (self.url, self.http_status))
-        self.headers = {}
-        for header in reply.rawHeaderList():
-            self.headers[unicode(header)] = unicode(reply.rawHeader(header))
+        self.headers = _LazyHeaders(reply)
         self._reply = reply
 
+    @property
+    def content(self):
+        """Returns resource content, as a string when it can be decoded."""
+        if not self._content_decoded:
+            self._content_decoded = True
+            try:
+                self._content = bytes(self._content).decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._content_decoded = True
+
+
+def _field_selector(form_selector, name):
+    """Returns a CSS selector matching the named fields of a form, with
+    name quoted as a CSS string.
+
+    :param form_selector: A CSS selector to the form.
+    :param name: The field name.
+    """
+    return '%s [name="%s"]' % (form_selector,
+        name.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _set_text_value(ghost, selector, element, value):
+    element.setFocus()
+    element.setAttribute('value', value)
+
+
+def _set_textarea_value(ghost, selector, element, value):
+    element.setFocus()
+    element.setPlainText(value)
+
+
+def _set_checkbox_value(element, value):
+    element.setFocus()
+    if value is True:
+        element.setAttribute('checked', 'checked')
+    else:
+        element.removeAttribute('checked')
+
+
+def _set_checkboxes_value(ghost, selector, element, value):
+    elements = ghost._find_all(selector)
+    if len(elements) > 1:
+        for el in elements:
+            _set_checkbox_value(el, el.attribute('value') == value)
+    else:
+        _set_checkbox_value(element, value)
+
+
+def _set_radio_value(ghost, selector, element, value):
+    for el in ghost._find_all(selector):
+        if el.attribute('value') == value:
+            el.setFocus()
+            el.setAttribute('checked', 'checked')
+
+
+def _set_file_value(ghost, selector, element, value):
+    Ghost._upload_file = value
+    try:
+        return ghost.click(selector)
+    finally:
+        Ghost._upload_file = None
+
+
+# Field setters used by Ghost.set_field_value(), by input type and by tag.
+_INPUT_SETTERS = dict.fromkeys(_TEXT_INPUT_TYPES, _set_text_value)
+_INPUT_SETTERS.update({
+    "checkbox": _set_checkboxes_value,
+    "radio": _set_radio_value,
+    "file": _set_file_value,
+})
+_TAG_SETTERS = {
+    "SELECT": _set_text_value,
+    "TEXTAREA": _set_textarea_value,
+}
+
 
 class Ghost(object):
     """Ghost manages a QWebPage.
@@ -167,16 +490,28 @@ class Ghost(object):
     :param viewport_size: A tupple that sets initial viewport size.
     :param ignore_ssl_errors: A boolean that forces ignore ssl errors.
     :param cache_dir: A directory path where to store cache datas.
+    :param cache: Either 'disk' to use a QNetworkDiskCache stored in
+        cache_dir, or 'memory' to keep the cache in memory.
+    :param cache_size_mb: The maximum cache size in megabytes. A disk
+        cache is shared by instances using the same cache_dir, the last
+        one created sets its size.
     :param plugins_enabled: Enable plugins (like Flash).
     :param java_enabled: Enable Java JRE.
     :param plugin_path: Array with paths to plugin directories (default ['/usr/lib/mozilla/plugins'])
     :param download_images: Indicate if the browser should download images
+    :param share_cookies: Share one cookie jar among all the instances
+        created with this option.
     """
     _alert = None
     _confirm_expected = None
     _prompt_expected = None
     _upload_file = None
     _app = None
+    _initialized = False
+    _caches = {}
+    _cookie_jar = None
+    wait_poll_interval = 50
+    capture_pool_size = 4
 
     def __init__(self, user_agent=default_user_agent, wait_timeout=8,
             wait_callback=None, log_level=logging.WARNING, display=False,
@@ -184,8 +519,18 @@ class Ghost(object):
             cache_dir=os.path.join(tempfile.gettempdir(), "ghost.py"),
             plugins_enabled=False, java_enabled=False,
             plugin_path=['/usr/lib/mozilla/plugins',],
-            download_images=True):
-        self.http_resources = []
+            download_images=True, share_cookies=False, cache='disk',
+            cache_size_mb=256):
+        if cache not in ('disk', 'memory'):
+            raise Exception("Invalid cache %s" % cache)
+        _lazy_qt()
+        self.http_resources = deque()
+        self._resources_by_url = {}
+        self._el_cache = {}
+        self._dom_batch_depth = 0
+        self._capture_pool = {}
+        self._exists_cache = {}
+        self._dom_generation_supported = False
 
         self.user_agent = user_agent
         self.wait_timeout = wait_timeout
@@ -198,22 +543,29 @@ class Ghost(object):
             try:
                 os.environ['DISPLAY'] = ':99'
                 Ghost.xvfb = subprocess.Popen(['Xvfb', ':99'])
+                # Scripts that never call shutdown() mustn't leave it running.
+                atexit.register(Ghost.shutdown)
             except OSError:
                 raise Exception('Xvfb is required to a ghost run oustside ' +\
                     'an X instance')
 
         self.display = display
 
-        if not Ghost._app:
+        if not Ghost._initialized:
             Ghost._app = QApplication.instance() or QApplication(['ghost'])
-            if plugin_path:
-                for p in plugin_path:
+            QtWebKit.QWebSettings.setMaximumPagesInCache(0)
+            QtWebKit.QWebSettings.setObjectCacheCapacities(0, 0, 0)
+            QtWebKit.QWebSettings.globalSettings().setAttribute(QtWebKit.QWebSettings.LocalStorageEnabled, True)
+            Ghost._initialized = True
+        if plugin_path:
+            # Adding a library path makes Qt rescan plugins, only does it
+            # for new ones.
+            library_paths = Ghost._app.libraryPaths()
+            for p in plugin_path:
+                if p not in library_paths:
                     Ghost._app.addLibraryPath(p)
 
         self.page = GhostWebPage(Ghost._app)
-        QtWebKit.QWebSettings.setMaximumPagesInCache(0)
-        QtWebKit.QWebSettings.setObjectCacheCapacities(0, 0, 0)
-        QtWebKit.QWebSettings.globalSettings().setAttribute(QtWebKit.QWebSettings.LocalStorageEnabled, True)
 
         self.page.setForwardUnsupportedContent(True)
         self.page.settings().setAttribute(QtWebKit.QWebSettings.AutoLoadImages, download_images)
@@ -232,12 +584,32 @@ class Ghost(object):
         self.manager.finished.connect(self._request_ended)
         self.manager.sslErrors.connect(self._on_manager_ssl_errors)
         # Cache
-        self.cache = QNetworkDiskCache()
-        self.cache.setCacheDirectory(cache_dir)
-        self.manager.setCache(self.cache)
+        cache_size = cache_size_mb * 1024 * 1024
+        if cache == 'memory':
+            self.cache = MemCache(cache_size)
+            self.manager.setCache(self.cache)
+        else:
+            # Shared by every instance using the same directory, the last
+            # instance created sets its maximum size.
+            self.cache = Ghost._caches.get(cache_dir)
+            if self.cache is None:
+                self.cache = Ghost._caches[cache_dir] = QNetworkDiskCache()
+                self.cache.setCacheDirectory(cache_dir)
+            self.cache.setMaximumCacheSize(cache_size)
+            self.manager.setCache(self.cache)
+            # The manager takes ownership of its cache, gives it back so
+            # that it outlives this instance.
+            self.cache.setParent(None)
         # Cookie jar
-        self.cookie_jar = QNetworkCookieJar()
+        if share_cookies:
+            if Ghost._cookie_jar is None:
+                Ghost._cookie_jar = QNetworkCookieJar()
+            self.cookie_jar = Ghost._cookie_jar
+        else:
+            self.cookie_jar = QNetworkCookieJar()
         self.manager.setCookieJar(self.cookie_jar)
+        if share_cookies:
+            self.cookie_jar.setParent(None)
         # User Agent
         self.page.setUserAgent(self.user_agent)
 
@@ -247,6 +619,9 @@ class Ghost(object):
             .connect(self._authenticate)
 
         self.main_frame = self.page.mainFrame()
+        self.main_frame.javaScriptWindowObjectCleared\
+            .connect(self._inject_helpers)
+        self._inject_helpers()
 
         logger.setLevel(log_level)
 
@@ -264,34 +639,39 @@ class Ghost(object):
     def __del__(self):
         self.exit()
 
-    def capture(self, region=None, selector=None,
-            format=QImage.Format_ARGB32_Premultiplied):
+    def capture(self, region=None, selector=None, format=None):
         """Returns snapshot as QImage.
 
         :param region: An optional tupple containing region as pixel
             coodinates.
         :param selector: A selector targeted the element to crop on.
-        :param format: The output image format.
+        :param format: The output image format, defaults to
+            QImage.Format_ARGB32_Premultiplied.
         """
+        if format is None:
+            format = QImage.Format_ARGB32_Premultiplied
         if region is None and selector is not None:
             region = self.region_for_selector(selector)
         if region:
             x1, y1, x2, y2 = region
             w, h = (x2 - x1), (y2 - y1)
-            image = QImage(QSize(x2, y2), format)
+            # Only renders the region, straight into a crop sized image.
+            image = self._capture_image(w, h, format)
             painter = QPainter(image)
-            self.main_frame.render(painter)
+            painter.translate(-x1, -y1)
+            self.main_frame.render(painter, QRegion(x1, y1, w, h))
             painter.end()
-            image = image.copy(x1, y1, w, h)
         else:
-            image = QImage(self.page.viewportSize(), format)
+            size = self.page.viewportSize()
+            image = self._capture_image(size.width(), size.height(), format)
             painter = QPainter(image)
             self.main_frame.render(painter)
             painter.end()
-        return image
+        # QImage is implicitly shared: the pooled buffer gets reused by
+        # the next capture unless the caller still holds this copy.
+        return QImage(image)
 
-    def capture_to(self, path, region=None, selector=None,
-        format=QImage.Format_ARGB32_Premultiplied):
+    def capture_to(self, path, region=None, selector=None, format=None):
         """Saves snapshot as image.
 
         :param path: The destination path.
@@ -307,7 +687,7 @@ class Ghost(object):
                      path,
                      paper_size    = (8.5, 11.0),
                      paper_margins = (0, 0, 0, 0),
-                     paper_units   = QPrinter.Inch,
+                     paper_units   = None,
                      zoom_factor   = 1.0,
                      ):
         """Saves page as a pdf file.
@@ -318,9 +698,12 @@ class Ghost(object):
         :param path: The destination path.
         :param paper_size: A 2-tuple indicating size of page to print to.
         :param paper_margins: A 4-tuple indicating size of each margin.
-        :param paper_units: Units for pager_size, pager_margins.
+        :param paper_units: Units for pager_size, pager_margins, defaults
+            to QPrinter.Inch.
         :param zoom_factor: Scale the output content.
         """
+        if paper_units is None:
+            paper_units = QPrinter.Inch
         assert len(paper_size) == 2
         assert len(paper_margins) == 4
         printer = QPrinter(mode = QPrinter.ScreenResolution)
@@ -329,11 +712,12 @@ class Ghost(object):
         printer.setPageMargins(*(paper_margins + (paper_units,)))
         printer.setFullPage(True)
         printer.setOutputFileName(path)
-        if self.webview is None:
-          self.webview = QtWebKit.QWebView()
-          self.webview.setPage(self.page)
-        self.webview.setZoomFactor(zoom_factor)
-        self.webview.print_(printer)
+        zoom = self.main_frame.zoomFactor()
+        self.main_frame.setZoomFactor(zoom_factor)
+        try:
+            self.main_frame.print_(printer)
+        finally:
+            self.main_frame.setZoomFactor(zoom)
 
     @can_load_page
     def click(self, selector):
@@ -341,15 +725,11 @@ class Ghost(object):
 
         :param selector: A CSS3 selector to targeted element.
         """
-        if not self.exists(selector):
-            raise Exception("Can't find element to click")
-        return self.evaluate("""
-            var element = document.querySelector("%s");
-            var evt = document.createEvent("MouseEvents");
-            evt.initMouseEvent("click", true, true, window, 1, 1, 1, 1, 1,
-                false, false, false, false, 0, element);
-            element.dispatchEvent(evt)
-        """ % selector)
+        with self._dom_batch():
+            if not self.exists(selector):
+                raise Exception("Can't find element to click")
+        return self.evaluate('window.__ghost.click(%s);' %
+            json.dumps(selector))
 
     class confirm:
         """Statement that tells Ghost how to deal with javascript confirm().
@@ -370,7 +750,7 @@ class Ghost(object):
     @property
     def content(self):
         """Returns current frame HTML as a string."""
-        return unicode(self.main_frame.toHtml())
+        return _text(self.main_frame.toHtml())
 
     @property
     def cookies(self):
@@ -387,7 +767,7 @@ class Ghost(object):
 
         :param script: The script to evaluate.
         """
-        return (self.main_frame.evaluateJavaScript("%s" % script),
+        return (self.main_frame.evaluateJavaScript(script),
             self._release_last_resources())
 
     def evaluate_js_file(self, path, encoding='utf-8'):
@@ -397,25 +777,61 @@ class Ghost(object):
         :param path: The path of the file.
         :param encoding: The file's encoding.
         """
-        self.evaluate(codecs.open(path, encoding=encoding).read())
+        with io.open(path, encoding=encoding) as f:
+            script = f.read()
+        self.evaluate(script)
 
     def exists(self, selector):
         """Checks if element exists for given selector.
 
         :param string: The element selector.
         """
-        return not self.main_frame.findFirstElement(selector).isNull()
+        generation = None
+        # Pseudo-classes like :checked or :focus can change without any
+        # DOM mutation, those selectors are never cached.
+        if self._dom_generation_supported and ':' not in selector:
+            generation = self.main_frame.evaluateJavaScript(
+                'window.__ghost.domGeneration();')
+        cached = self._exists_cache.get(selector)
+        if generation is not None and cached is not None and \
+                cached[0] == generation:
+            return cached[1]
+        with self._dom_batch():
+            found = not self._find_first(selector).isNull()
+        if generation is not None:
+            self._exists_cache[selector] = (generation, found)
+        return found
 
     def exit(self):
-        """Exits application and relateds."""
+        """Releases page and relateds. Use Ghost.shutdown() to quit the
+        application shared by all instances.
+        """
+        if not hasattr(self, 'page'):
+            return
         if self.display:
             self.webview.close()
-        Ghost._app.quit()
+        # Connected bound methods would keep this instance, and the whole
+        # page graph, alive.
+        for signal, slot in [
+                (self.page.loadFinished, self._page_loaded),
+                (self.page.loadStarted, self._page_load_started),
+                (self.page.unsupportedContent, self._unsupported_content),
+                (self.manager.finished, self._request_ended),
+                (self.manager.sslErrors, self._on_manager_ssl_errors),
+                (self.manager.authenticationRequired, self._authenticate),
+                (self.manager.proxyAuthenticationRequired,
+                    self._authenticate),
+                (self.main_frame.javaScriptWindowObjectCleared,
+                    self._inject_helpers)]:
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                pass
+        # The network manager is a child of the page and goes with it.
+        self.page.deleteLater()
         del self.manager
         del self.page
         del self.main_frame
-        if hasattr(self, 'xvfb'):
-            self.xvfb.terminate()
 
     @can_load_page
     def fill(self, selector, values):
@@ -424,11 +840,74 @@ class Ghost(object):
         :param selector: A CSS selector to the target form to fill.
         :param values: A dict containing the values.
         """
-        if not self.exists(selector):
+        # Sets every field in a single script evaluation, only file
+        # fields need to go through set_field_value().
+        result, resources = self.evaluate(r"""
+            (function(formSelector, values) {
+                var form = document.querySelector(formSelector);
+                if (form === null) {
+                    return null;
+                }
+                var textTypes = %s;
+                var result = {missing: [], files: [], unsupported: []};
+                for (var name in values) {
+                    var value = values[name];
+                    var fields = form.querySelectorAll('[name="' +
+                        name.replace(/(["\\])/g, '\\$1') + '"]');
+                    if (fields.length === 0) {
+                        result.missing.push(name);
+                        continue;
+                    }
+                    var field = fields[0];
+                    var type = (field.getAttribute('type') || '')
+                        .toLowerCase();
+                    if (field.tagName === 'INPUT' && type === 'file') {
+                        result.files.push(name);
+                        continue;
+                    }
+                    field.focus();
+                    if (field.tagName === 'SELECT' ||
+                            field.tagName === 'TEXTAREA') {
+                        field.value = value;
+                    } else if (field.tagName === 'INPUT') {
+                        if (textTypes.hasOwnProperty(type)) {
+                            field.value = value;
+                        } else if (type === 'checkbox') {
+                            if (fields.length > 1) {
+                                for (var i = 0; i < fields.length; i++) {
+                                    fields[i].checked =
+                                        fields[i].value === value;
+                                }
+                            } else {
+                                field.checked = value === true;
+                            }
+                        } else if (type === 'radio') {
+                            for (var i = 0; i < fields.length; i++) {
+                                if (fields[i].value === value) {
+                                    fields[i].checked = true;
+                                }
+                            }
+                        }
+                    } else {
+                        result.unsupported.push(name);
+                        continue;
+                    }
+                    field.blur();
+                }
+                return result;
+            })(%s, %s);
+        """ % (json.dumps(dict.fromkeys(_TEXT_INPUT_TYPES, True)),
+            json.dumps(selector),
+            json.dumps(values)))
+        if result is None:
             raise Exception("Can't find form")
-        resources = []
-        for field in values:
-            r, res = self.set_field_value("%s [name=%s]" % (selector, field),
+        if result['missing']:
+            raise Exception('can\'t find element for %s' %
+                _field_selector(selector, result['missing'][0]))
+        if result['unsupported']:
+            raise Exception('unsuported field tag')
+        for field in result['files']:
+            r, res = self.set_field_value(_field_selector(selector, field),
                 values[field])
             resources.extend(res)
         return True, resources
@@ -441,16 +920,16 @@ class Ghost(object):
         :param method: The name of the method to fire.
         :param expect_loading: Specifies if a page loading is expected.
         """
-        return self.evaluate('document.querySelector("%s").%s();' % \
-            (selector, method))
+        return self.evaluate('window.__ghost.fire(%s, %s);' %
+            (json.dumps(selector), json.dumps(method)))
 
     def global_exists(self, global_name):
         """Checks if javascript global exists.
 
         :param global_name: The name of the global.
         """
-        return self.evaluate('!(typeof %s === "undefined");' %
-            global_name)[0]
+        return self.evaluate('window.__ghost.hasGlobal(%s);' %
+            json.dumps(global_name))[0]
 
     def hide(self):
         """Close the webview."""
@@ -508,7 +987,8 @@ class Ghost(object):
 
         :param selector: The targeted element.
         """
-        geo = self.main_frame.findFirstElement(selector).geometry()
+        with self._dom_batch():
+            geo = self._find_first(selector).geometry()
         try:
             region = (geo.left(), geo.top(), geo.right(), geo.bottom())
         except:
@@ -523,66 +1003,8 @@ class Ghost(object):
         :param value: The value to fill in.
         :param blur: An optional boolean that force blur when filled in.
         """
-        def _set_checkbox_value(el, value):
-            el.setFocus()
-            if value is True:
-                el.setAttribute('checked', 'checked')
-            else:
-                el.removeAttribute('checked')
-
-        def _set_checkboxes_value(els, value):
-            for el in els:
-                if el.attribute('value') == value:
-                    _set_checkbox_value(el, True)
-                else:
-                    _set_checkbox_value(el, False)
-
-        def _set_radio_value(els, value):
-            for el in els:
-                if el.attribute('value') == value:
-                    el.setFocus()
-                    el.setAttribute('checked', 'checked')
-
-        def _set_text_value(el, value):
-            el.setFocus()
-            el.setAttribute('value', value)
-
-        def _set_textarea_value(el, value):
-            el.setFocus()
-            el.setPlainText(value)
-
-        res, ressources = None, []
-        element = self.main_frame.findFirstElement(selector)
-        if element.isNull():
-            raise Exception('can\'t find element for %s"' % selector)
-        if element.tagName() == "SELECT":
-            _set_text_value(element, value)
-        elif element.tagName() == "TEXTAREA":
-            _set_textarea_value(element, value)
-        elif element.tagName() == "INPUT":
-            if element.attribute('type') in ["color", "date", "datetime",
-                "datetime-local", "email", "hidden", "month", "number",
-                "password", "range", "search", "tel", "text", "time",
-                "url", "week"]:
-                _set_text_value(element, value)
-            elif element.attribute('type') == "checkbox":
-                els = self.main_frame.findAllElements(selector)
-                if els.count() > 1:
-                    _set_checkboxes_value(els, value)
-                else:
-                    _set_checkbox_value(element, value)
-            elif element.attribute('type') == "radio":
-                _set_radio_value(self.main_frame.findAllElements(selector),
-                    value)
-            elif element.attribute('type') == "file":
-                Ghost._upload_file = value
-                res, resources = self.click(selector)
-                Ghost._upload_file = None
-        else:
-            raise Exception('unsuported field tag')
-        if blur:
-            self.fire_on(selector, 'blur')
-        return res, ressources
+        with self._dom_batch():
+            return self._set_field_value(selector, value, blur)
 
     def set_viewport_size(self, width, height):
         """Sets the page viewport size.
@@ -592,6 +1014,17 @@ class Ghost(object):
         """
         self.page.setViewportSize(QSize(width, height))
 
+    @classmethod
+    def shutdown(cls):
+        """Quits the Qt application shared by all Ghost instances, and
+        stops the Xvfb server started for them if any.
+        """
+        if cls._app is not None:
+            cls._app.quit()
+        if hasattr(Ghost, 'xvfb'):
+            Ghost.xvfb.terminate()
+            del Ghost.xvfb
+
     def show(self):
         """Show current page inside a QWebView.
         """
@@ -599,26 +1032,88 @@ class Ghost(object):
         self.webview.setPage(self.page)
         self.webview.show()
 
-    def wait_for(self, condition, timeout_message):
+    def wait_for(self, condition, timeout_message, signals=None):
         """Waits until condition is True.
 
+        The condition is polled every `wait_poll_interval` milliseconds,
+        and tested again soon after one of the given signals is emitted.
+
         :param condition: A callable that returns the condition.
         :param timeout_message: The exception message on timeout.
+        :param signals: An optional list of Qt signals that may change
+            the condition.
         """
-        started_at = time.time()
-        while not condition():
-            if time.time() > (started_at + self.wait_timeout):
-                raise Exception(timeout_message)
-            time.sleep(0.01)
-            Ghost._app.processEvents()
-            if self.wait_callback is not None:
-                self.wait_callback()
+        if condition():
+            return
+        signals = signals or []
+        loop = QEventLoop()
+        callback = self.wait_callback
+        satisfied = []
+        errors = []
+
+        # Qt only prints exceptions raised in slots, they are kept here
+        # and raised again once the loop is left.
+        def check():
+            try:
+                if condition():
+                    satisfied.append(True)
+                    loop.quit()
+            except Exception:
+                errors.append(sys.exc_info())
+                loop.quit()
+
+        def tick():
+            if callback is not None:
+                try:
+                    callback()
+                except Exception:
+                    errors.append(sys.exc_info())
+                    loop.quit()
+                    return
+            check()
+
+        # Signals only schedule a check, so that bursts of them (e.g. one
+        # repaintRequested per dirty rect) lead to a single check, run
+        # outside of WebKit's own callbacks.
+        recheck = QTimer()
+        recheck.setSingleShot(True)
+        recheck.timeout.connect(check)
+
+        def schedule(*args):
+            if not recheck.isActive():
+                recheck.start(0)
+
+        for signal in signals:
+            signal.connect(schedule)
+        # Qt timers run on a monotonic clock, wall clock jumps can't
+        # shorten or extend the wait.
+        timeout = QTimer()
+        timeout.setSingleShot(True)
+        timeout.timeout.connect(loop.quit)
+        timeout.start(int(self.wait_timeout * 1000))
+        # Not every change emits a signal, e.g. hidden DOM changes aren't
+        # repainted, so polling stays as a fallback.
+        poll = QTimer()
+        poll.timeout.connect(tick)
+        poll.start(self.wait_poll_interval)
+        try:
+            loop.exec_()
+        finally:
+            poll.stop()
+            timeout.stop()
+            recheck.stop()
+            for signal in signals:
+                signal.disconnect(schedule)
+        if errors:
+            _reraise(*errors[0])
+        if not satisfied and not condition():
+            raise Exception(timeout_message)
 
     def wait_for_alert(self):
         """Waits for main frame alert().
         """
         self.wait_for(lambda: Ghost._alert is not None,
-            'User has not been alerted.')
+            'User has not been alerted.', signals=[self.page.alerted])
         msg = Ghost._alert
         Ghost._alert = None
         return msg, self._release_last_resources()
@@ -627,15 +1122,11 @@ class Ghost(object):
         """Waits until page is loaded, assumed that a page as been requested.
         """
         self.wait_for(lambda: self.loaded,
-            'Unable to load requested page')
-        resources = self._release_last_resources()
-        page = None
-        url = self.main_frame.url().toString()
-
-        for resource in resources:
-            if url == resource.url:
-                page = resource
-        return page, resources
+            'Unable to load requested page',
+            signals=[self.page.loadFinished])
+        page = self._resources_by_url.get(
+            _text(self.main_frame.url().toString()))
+        return page, self._release_last_resources()
 
     def wait_for_selector(self, selector):
         """Waits until selector match an element on the frame.
@@ -643,7 +1134,8 @@ class Ghost(object):
         :param selector: The selector to wait for.
         """
         self.wait_for(lambda: self.exists(selector),
-            'Can\'t find element matching "%s"' % selector)
+            'Can\'t find element matching "%s"' % selector,
+            signals=self._dom_signals)
         return True, self._release_last_resources()
 
     def wait_for_text(self, text):
@@ -651,10 +1143,73 @@ class Ghost(object):
 
         :param text: The text to wait for.
         """
-        self.wait_for(lambda: text in self.content,
-            'Can\'t find "%s" in current frame' % text)
+        # The lookup runs inside the page: a MutationObserver only marks
+        # the document as dirty, so each check searches again only when
+        # something changed rather than serializing the frame HTML.
+        script = """
+            (function(needle, reset) {
+                var state = window.__ghost_text;
+                if (!state || state.needle !== needle) {
+                    if (state && state.observer) {
+                        state.observer.disconnect();
+                    }
+                    state = window.__ghost_text = {needle: needle,
+                        dirty: true, found: false, observer: null};
+                    var Observer = window.MutationObserver ||
+                        window.WebKitMutationObserver;
+                    if (Observer) {
+                        state.observer = new Observer(function() {
+                            state.dirty = true;
+                        });
+                        state.observer.observe(document, {
+                            childList: true, subtree: true,
+                            characterData: true, attributes: true});
+                    }
+                }
+                if (reset || state.dirty || !state.observer) {
+                    state.dirty = false;
+                    state.found = document.body !== null &&
+                        document.body.innerText.indexOf(needle) !== -1;
+                }
+                return state.found;
+            })(%s, %s);
+        """
+        needle = json.dumps(text)
+        # Searches again from scratch first, the text may have gone away
+        # since a previous call found it.
+        self.main_frame.evaluateJavaScript(script % (needle, 'true'))
+        script = script % (needle, 'false')
+        try:
+            self.wait_for(lambda: self.main_frame.evaluateJavaScript(script),
+                'Can\'t find "%s" in current frame' % text,
+                signals=self._dom_signals)
+        finally:
+            self.main_frame.evaluateJavaScript("""
+                (function() {
+                    var state = window.__ghost_text;
+                    if (state && state.observer) {
+                        state.observer.disconnect();
+                    }
+                    window.__ghost_text = undefined;
+                })();
+            """)
         return True, self._release_last_resources()
 
+    @property
+    def _dom_signals(self):
+        """Page signals emitted when the frame DOM may have changed."""
+        return [self.page.loadFinished, self.page.contentsChanged,
+            self.page.repaintRequested]
+
+    def _add_resource(self, reply, resource):
+        """Adds a resource to http_resources and indexes it by url.
+
+        :param reply: The QNetworkReply object.
+        :param resource: The HttpResource built from reply.
+        """
+        self.http_resources.append(resource)
+        self._resources_by_url[_text(reply.url().toString())] = resource
+
     def _authenticate(self, mix, authenticator):
         """Called back on basic / proxy http auth.
 
@@ -667,11 +1222,82 @@ class Ghost(object):
             authenticator.setPassword(password)
             self._auth_attempt += 1
 
+    def _capture_image(self, width, height, format):
+        """Returns a cleared QImage of given size and format, reusing
+        the one from a previous capture when possible.
+
+        :param width: The image width.
+        :param height: The image height.
+        :param format: The image format.
+        """
+        key = (width, height, format)
+        image = self._capture_pool.get(key)
+        if image is None:
+            if len(self._capture_pool) >= self.capture_pool_size:
+                self._capture_pool.clear()
+            image = self._capture_pool[key] = QImage(QSize(width, height),
+                format)
+        image.fill(0)
+        return image
+
+    @contextmanager
+    def _dom_batch(self):
+        """Context manager that caches element lookups until the outermost
+        batch exits, so one API call doesn't walk the DOM twice for the
+        same selector.
+        """
+        self._dom_batch_depth += 1
+        try:
+            yield
+        finally:
+            self._dom_batch_depth -= 1
+            if not self._dom_batch_depth:
+                self._el_cache.clear()
+
+    def _find_all(self, selector):
+        """Returns the list of elements matching given selector, cached
+        within a DOM batch.
+
+        :param selector: The CSS selector.
+        """
+        key = (id(self.main_frame), 'all', selector)
+        if key in self._el_cache:
+            return self._el_cache[key]
+        elements = self.main_frame.findAllElements(selector).toList()
+        if self._dom_batch_depth:
+            self._el_cache[key] = elements
+        return elements
+
+    def _find_first(self, selector):
+        """Returns the first element matching given selector, cached
+        within a DOM batch.
+
+        :param selector: The CSS selector.
+        """
+        key = (id(self.main_frame), 'first', selector)
+        if key in self._el_cache:
+            return self._el_cache[key]
+        element = self.main_frame.findFirstElement(selector)
+        if self._dom_batch_depth:
+            self._el_cache[key] = element
+        return element
+
+    def _inject_helpers(self):
+        """Called back when the main frame window object is cleared,
+        binds Ghost javascript helpers to the new window.
+        """
+        self._exists_cache.clear()
+        self.main_frame.evaluateJavaScript(_HELPERS_JS)
+        # Engines without MutationObserver (e.g. QtWebKit 2.2) can't count
+        # DOM generations, exists() then skips that extra round trip.
+        self._dom_generation_supported = bool(
+            self.main_frame.evaluateJavaScript(
+                '!!(window.MutationObserver || window.WebKitMutationObserver)'))
+
     def _page_loaded(self):
         """Called back when page is loaded.
         """
         self.loaded = True
-        self.cache.clear()
 
     def _page_load_started(self):
         """Called back when page load started.
@@ -683,8 +1309,11 @@ class Ghost(object):
 
         :return: The released resources.
         """
-        last_resources = self.http_resources
-        self.http_resources = []
+        # Clears the containers in place so that they are reused from
+        # one wait to the next.
+        last_resources = list(self.http_resources)
+        self.http_resources.clear()
+        self._resources_by_url.clear()
         return last_resources
 
     def _request_ended(self, reply):
@@ -693,7 +1322,34 @@ class Ghost(object):
         :param reply: The QNetworkReply object.
         """
         if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute):
-            self.http_resources.append(HttpResource(reply, self.cache))
+            self._add_resource(reply, HttpResource(reply, self.cache))
+
+    def _set_field_value(self, selector, value, blur):
+        """Sets the value of the field matched by given selector, within
+        a DOM batch.
+
+        :param selector: A CSS selector that target the field.
+        :param value: The value to fill in.
+        :param blur: A boolean that force blur when filled in.
+        """
+        res, resources = None, []
+        element = self._find_first(selector)
+        if element.isNull():
+            raise Exception('can\'t find element for %s"' % selector)
+        tag = _text(element.tagName())
+        if tag == "INPUT":
+            setter = _INPUT_SETTERS.get(_text(element.attribute('type')))
+        elif tag in _TAG_SETTERS:
+            setter = _TAG_SETTERS[tag]
+        else:
+            raise Exception('unsuported field tag')
+        if setter is not None:
+            result = setter(self, selector, element, value)
+            if result is not None:
+                res, resources = result
+        if blur:
+            element.evaluateJavaScript('this.blur();')
+        return res, resources
 
     def _unsupported_content(self, reply):
         """Adds an HttpResource object to http_resources with unsupported
@@ -701,12 +1357,33 @@ class Ghost(object):
 
         :param reply: The QNetworkReply object.
         """
-        if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute):
-            self.http_resources.append(HttpResource(reply, self.cache,
+        if not reply.attribute(QNetworkRequest.HttpStatusCodeAttribute):
+            return
+        if reply.isFinished():
+            self._add_resource(reply, HttpResource(reply, self.cache,
                 reply.readAll()))
+            return
+        # The resource is added right away with the body received so
+        # far, the rest is drained chunk by chunk as it arrives rather
+        # than blocking on the whole download.
+        buffer = QBuffer()
+        buffer.open(QIODevice.WriteOnly)
+
+        def read():
+            buffer.write(reply.read(reply.bytesAvailable()))
+
+        def finished():
+            read()
+            resource.content = buffer.data()
+
+        read()
+        resource = HttpResource(reply, self.cache, buffer.data())
+        self._add_resource(reply, resource)
+        reply.readyRead.connect(read)
+        reply.readChannelFinished.connect(finished)
 
     def _on_manager_ssl_errors(self, reply, errors):
-        url = unicode(reply.url().toString())
+        url = _text(reply.url().toString())
         if self.ignore_ssl_errors:
             reply.ignoreSslErrors()
         else:
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import sys
+import subprocess
 import unittest
 import logging
 
@@ -48,6 +50,36 @@ class GhostTest(GhostTestCase):
         self.assertIn('MooTools: the javascript framework',
             resources[1].content)
 
+    def test_memory_cache(self):
+        ghost = Ghost(cache='memory', wait_timeout=self.wait_timeout)
+        page, resources = ghost.open("%smootools" % base_url)
+        self.assertIn('MooTools: the javascript framework',
+            resources[1].content)
+        self.assertTrue(ghost.cache.cacheSize() > 0)
+        ghost.exit()
+
+    def test_memory_cache_eviction(self):
+        from ghost.ghost import MemCache, QNetworkCacheMetaData, QUrl
+
+        cache = MemCache(10)
+
+        def store(url, data):
+            meta_data = QNetworkCacheMetaData()
+            meta_data.setUrl(QUrl(url))
+            device = cache.prepare(meta_data)
+            device.write(data)
+            cache.insert(device)
+
+        store('http://a/', 'aaaa')
+        store('http://b/', 'bbbb')
+        # Reading a makes b the least recently used entry.
+        cache.data(QUrl('http://a/'))
+        store('http://c/', 'cccc')
+        self.assertTrue(cache.metaData(QUrl('http://a/')).isValid())
+        self.assertFalse(cache.metaData(QUrl('http://b/')).isValid())
+        self.assertTrue(cache.metaData(QUrl('http://c/')).isValid())
+        self.assertEqual(cache.cacheSize(), 8)
+
     def test_extra_resource_binaries(self):
         page, resources = self.ghost.open("%simage" % base_url)
         self.assertEqual(resources[1].content.__class__.__name__,
@@ -60,12 +92,57 @@ class GhostTest(GhostTestCase):
             .wait_for_selector("#list li:nth-child(2)")
         self.assertEqual(resources[0].url, "%sitems.json" % base_url)
 
+    def test_exists_after_mutation(self):
+        self.ghost.open(base_url)
+        self.assertFalse(self.ghost.exists('#added'))
+        self.ghost.evaluate(
+            'var p = document.createElement("p"); p.id = "added";'
+            'document.body.appendChild(p);')
+        self.assertTrue(self.ghost.exists('#added'))
+        self.ghost.evaluate(
+            'document.body.removeChild(document.getElementById("added"));')
+        self.assertFalse(self.ghost.exists('#added'))
+
+    def test_exists_checked_after_fill(self):
+        self.ghost.open("%sform" % base_url)
+        self.assertFalse(self.ghost.exists('#checkbox:checked'))
+        self.ghost.fill('#contact-form', {'checkbox': True})
+        self.assertTrue(self.ghost.exists('#checkbox:checked'))
+        success, resources = self.ghost.wait_for_selector('#checkbox:checked')
+        self.assertTrue(success)
+
     def test_wait_for_text(self):
         page, resources = self.ghost.open("%smootools" % base_url)
         self.ghost.click("#button")
         success, resources = self.ghost.wait_for_text("second item")
         self.assertEqual(resources[0].url, "%sitems.json" % base_url)
 
+    def test_wait_for_removed_text(self):
+        self.ghost.open(base_url)
+        self.ghost.wait_for_text("home page")
+        self.ghost.evaluate('document.body.innerHTML = "";')
+        self.assertRaises(Exception, self.ghost.wait_for_text, "home page")
+
+    def test_wait_for_revealed_text(self):
+        self.ghost.open(base_url)
+        self.ghost.evaluate("""
+            var el = document.createElement('div');
+            el.style.display = 'none';
+            el.appendChild(document.createTextNode('revealed text'));
+            document.body.appendChild(el);
+            setTimeout(function() { el.style.display = 'block'; }, 200);
+        """)
+        result, resources = self.ghost.wait_for_text("revealed text")
+        self.assertEqual(result, True)
+
+    def test_wait_for_condition_error(self):
+        self.ghost.open(base_url)
+
+        def condition():
+            raise ValueError('aborted')
+        self.assertRaises(ValueError, self.ghost.wait_for, condition,
+            'timeout')
+
     def test_wait_for_timeout(self):
         self.ghost.open("%s" % base_url)
         self.assertRaises(Exception, self.ghost.wait_for_text, "undefined")
@@ -120,6 +197,20 @@ class GhostTest(GhostTestCase):
         page, resources = self.ghost.click('a', expect_loading=True)
         self.assertEqual(page.url, "%sform" % base_url)
 
+    def test_click_quoted_selector(self):
+        page, resources = self.ghost.open("%s" % base_url)
+        page, resources = self.ghost.click('a[href="/form"]',
+            expect_loading=True)
+        self.assertEqual(page.url, "%sform" % base_url)
+
+    def test_exit_keeps_siblings_working(self):
+        ghost = Ghost(wait_timeout=self.wait_timeout)
+        ghost.open(base_url)
+        ghost.exit()
+        page, resources = self.ghost.open(base_url)
+        self.assertEqual(page.http_status, 200)
+        self.assertTrue("Test page" in self.ghost.content)
+
     def test_cookies(self):
         self.ghost.open("%scookie" % base_url)
         self.assertEqual(len(self.ghost.cookies), 1)
@@ -176,6 +267,27 @@ class GhostTest(GhostTestCase):
         self.assertTrue(os.path.isfile('test.png'))
         os.remove('test.png')
 
+    def test_print_to_pdf(self):
+        self.ghost.open(base_url)
+        self.ghost.print_to_pdf('test.pdf')
+        self.assertTrue(os.path.isfile('test.pdf'))
+        os.remove('test.pdf')
+        self.assertIsNone(self.ghost.webview)
+
+    def test_capture_default_format(self):
+        from ghost.ghost import QImage
+        self.ghost.open(base_url)
+        image = self.ghost.capture()
+        self.assertEqual(image.format(), QImage.Format_ARGB32_Premultiplied)
+
+    def test_import_without_qt(self):
+        code = ("import sys; sys.modules['PyQt4'] = None; "
+            "sys.modules['PySide'] = None; import ghost.ghost; "
+            "assert ghost.ghost.QtWebKit is None")
+        self.assertEqual(subprocess.call([sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            0)
+
     def test_region_for_selector(self):
         self.ghost.open(base_url)
         x1, y1, x2, y2 = self.ghost.region_for_selector('h1')